@@ -2,6 +2,7 @@
 #
 # It finds the leak if a Py_DECREF is commented out in module.c.
 
+import functools
 import gc
 import tracemalloc
 import unittest
@@ -9,35 +10,53 @@ import unittest
 import quickjs
 import test_quickjs
 
+loader = unittest.TestLoader()
+runner = unittest.TextTestRunner()
+
+def iterate_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iterate_tests(test)
+        else:
+            yield test
+
+@functools.lru_cache(maxsize=None)
+def test_names():
+    # Discovery walks the file system and imports modules, so it is only done once. The suite
+    # itself can not be reused, since running it releases the tests in it.
+    return tuple(test.id() for test in iterate_tests(loader.discover(".")))
+
 def run():
-    loader = unittest.TestLoader()
-    suite = loader.discover(".")
-    runner = unittest.TextTestRunner()
-    runner.run(suite)
+    runner.run(loader.loadTestsFromNames(test_names()))
 
 filters = [
     tracemalloc.Filter(True, quickjs.__file__),
     tracemalloc.Filter(True, test_quickjs.__file__),
 ]
 
-def main():
-    print("Warming up (to discount regex cache etc.)")
-    run()
-
-    tracemalloc.start(25)
+def measure(depth, key_type):
+    tracemalloc.start(depth)
     gc.collect()
     snapshot1 = tracemalloc.take_snapshot().filter_traces(filters)
     run()
     gc.collect()
     snapshot2 = tracemalloc.take_snapshot().filter_traces(filters)
+    tracemalloc.stop()
+    return [stat for stat in snapshot2.compare_to(snapshot1, key_type) if stat.size_diff != 0]
+
+def main():
+    print("Warming up (to discount regex cache etc.)")
+    run()
 
-    top_stats = snapshot2.compare_to(snapshot1, 'traceback')
+    # Shallow tracebacks are much cheaper to record and compare. Full tracebacks are only
+    # collected, in a second run, if something was not released.
+    top_stats = measure(5, 'filename')
+    if top_stats:
+        top_stats = measure(25, 'traceback')
 
     print("Objects not released")
     print("====================")
     for stat in top_stats:
-        if stat.size_diff == 0:
-            continue
         print(stat)
         for line in stat.traceback.format():
             print("    ", line)
@@ -1,4 +1,8 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <inttypes.h>
+#include <math.h>
+#include <stddef.h>
 #include <time.h>
 
 #include "upstream-quickjs/quickjs.h"
@@ -21,6 +25,7 @@ typedef struct {
 typedef struct {
 	PyObject_HEAD JSRuntime *runtime;
 	JSContext *context;
+	int has_memory_limit;
 	int has_time_limit;
 	clock_t time_limit;
 	// Used when releasing the GIL.
@@ -31,13 +36,31 @@ typedef struct {
 	// Python's GC. Having them stored only in QuickJS' function opaques would create a dependency
 	// cycle across Python and QuickJS that neither GC can notice.
 	PythonCallableNode *python_callables;
+	// Compiled scripts of recent calls to eval. Maps the source code to a capsule holding the
+	// compiled function, so that evaluating the same code again does not need to parse it.
+	PyObject *eval_cache;
+	// The builtin Object.prototype.toString, which reveals the class of an object.
+	JSValue object_to_string;
+	// The builtin Number.prototype.valueOf, which throws for anything but Number objects.
+	JSValue number_value_of;
 } RuntimeData;
 
+// Maximum number of entries in the eval cache. The oldest entry is evicted first.
+#define EVAL_CACHE_SIZE 256
+#define EVAL_CACHE_CAPSULE_NAME "_quickjs.eval_cache"
+
+// Whether Python supports the vectorcall protocol, which avoids creating an argument tuple for
+// every call.
+#define USE_VECTORCALL (PY_VERSION_HEX >= 0x03090000)
+
 // The data of the type _quickjs.Object.
 typedef struct {
 	PyObject_HEAD;
 	RuntimeData *runtime_data;
 	JSValue object;
+#if USE_VECTORCALL
+	vectorcallfunc vectorcall;
+#endif
 } ObjectData;
 
 // The exception raised by this module.
@@ -113,11 +136,20 @@ static int object_traverse(ObjectData *self, visitproc visit, void *arg) {
 	return 0;
 }
 
+#if USE_VECTORCALL
+// _quickjs.Object.__call__ via vectorcall.
+static PyObject *object_vectorcall(ObjectData *self, PyObject *const *args, size_t nargsf,
+                                   PyObject *kwnames);
+#endif
+
 // Creates an instance of the Object class.
 static PyObject *object_new(PyTypeObject *type, PyObject *args, PyObject *kwds) {
 	ObjectData *self = PyObject_GC_New(ObjectData, type);
 	if (self != NULL) {
 		self->runtime_data = NULL;
+#if USE_VECTORCALL
+		self->vectorcall = (vectorcallfunc)object_vectorcall;
+#endif
 	}
 	return (PyObject *)self;
 }
@@ -142,13 +174,30 @@ static PyObject *object_call(ObjectData *self, PyObject *args, PyObject *kwds);
 // Returns the JSON representation of the object as a Python string.
 static PyObject *object_json(ObjectData *self) {
 	JSContext *context = self->runtime_data->context;
+	// toJSON methods and getters may run arbitrary JS code.
+	prepare_call_js(self->runtime_data);
 	JSValue json_string = JS_JSONStringify(context, self->object, JS_UNDEFINED, JS_UNDEFINED);
+	end_call_js(self->runtime_data);
 	return quickjs_to_python(self->runtime_data, json_string);
 }
 
+// _quickjs.Object.to_python
+static PyObject *object_to_python(ObjectData *self);
+
+// _quickjs.Object.call_with_args
+static PyObject *object_call_with_args(ObjectData *self, PyObject *args);
+
 // All methods of the _quickjs.Object class.
 static PyMethodDef object_methods[] = {
     {"json", (PyCFunction)object_json, METH_NOARGS, "Converts to a JSON string."},
+    {"to_python",
+     (PyCFunction)object_to_python,
+     METH_NOARGS,
+     "Converts to Python lists, dicts etc. like json.loads(obj.json()) would."},
+    {"call_with_args",
+     (PyCFunction)object_call_with_args,
+     METH_O,
+     "Calls the object with the arguments in a tuple or list."},
     {NULL} /* Sentinel */
 };
 
@@ -157,7 +206,13 @@ static PyTypeObject Object = {PyVarObject_HEAD_INIT(NULL, 0).tp_name = "_quickjs
                               .tp_doc = "Quickjs object",
                               .tp_basicsize = sizeof(ObjectData),
                               .tp_itemsize = 0,
+#if USE_VECTORCALL
+                              .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC |
+                                          Py_TPFLAGS_HAVE_VECTORCALL,
+                              .tp_vectorcall_offset = offsetof(ObjectData, vectorcall),
+#else
                               .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+#endif
                               .tp_traverse = (traverseproc)object_traverse,
                               .tp_new = object_new,
                               .tp_dealloc = (destructor)object_dealloc,
@@ -175,7 +230,8 @@ static int python_to_quickjs_possible(RuntimeData *runtime_data, PyObject *item)
 	} else if (item == Py_None) {
 		return 1;
 	} else if (PyUnicode_Check(item)) {
-		return 1;
+		// Fails for e.g. lone surrogates. The UTF-8 is cached in the str for python_to_quickjs.
+		return PyUnicode_AsUTF8AndSize(item, NULL) != NULL;
 	} else if (PyObject_IsInstance(item, (PyObject *)&Object)) {
 		ObjectData *object = (ObjectData *)item;
 		if (object->runtime_data != runtime_data) {
@@ -214,7 +270,9 @@ static JSValueConst python_to_quickjs(RuntimeData *runtime_data, PyObject *item)
 	} else if (item == Py_None) {
 		return JS_NULL;
 	} else if (PyUnicode_Check(item)) {
-		return JS_NewString(runtime_data->context, PyUnicode_AsUTF8(item));
+		Py_ssize_t length;
+		const char *cstring = PyUnicode_AsUTF8AndSize(item, &length);
+		return JS_NewStringLen(runtime_data->context, cstring, length);
 	} else if (PyObject_IsInstance(item, (PyObject *)&Object)) {
 		return JS_DupValue(runtime_data->context, ((ObjectData *)item)->object);
 	} else {
@@ -223,8 +281,11 @@ static JSValueConst python_to_quickjs(RuntimeData *runtime_data, PyObject *item)
 	}
 }
 
-// _quickjs.Object.__call__
-static PyObject *object_call(ObjectData *self, PyObject *args, PyObject *kwds) {
+// Number of arguments that object calls can convert without allocating memory.
+#define STACK_ARGS_SIZE 8
+
+// Calls the object with the provided Python objects as arguments.
+static PyObject *object_call_internal(ObjectData *self, PyObject *const *items, Py_ssize_t nargs) {
 	if (self->runtime_data == NULL) {
 		// This object does not have a context and has not been created by this module.
 		Py_RETURN_NONE;
@@ -232,44 +293,95 @@ static PyObject *object_call(ObjectData *self, PyObject *args, PyObject *kwds) {
 
 	// We first loop through all arguments and check that they are supported without doing anything.
 	// This makes the cleanup code simpler for the case where we have to raise an error.
-	const int nargs = PyTuple_Size(args);
-	for (int i = 0; i < nargs; ++i) {
-		PyObject *item = PyTuple_GetItem(args, i);
-		if (!python_to_quickjs_possible(self->runtime_data, item)) {
+	for (Py_ssize_t i = 0; i < nargs; ++i) {
+		if (!python_to_quickjs_possible(self->runtime_data, items[i])) {
 			return NULL;
 		}
 	}
 
-	// Now we know that all arguments are supported and we can convert them.
-	JSValueConst *jsargs;
-	if (nargs) {
+	// Now we know that all arguments are supported and we can convert them. Most calls have few
+	// arguments, which then fit on the stack.
+	JSValueConst stack_jsargs[STACK_ARGS_SIZE];
+	JSValueConst *jsargs = stack_jsargs;
+	if (nargs > STACK_ARGS_SIZE) {
 		jsargs = js_malloc(self->runtime_data->context, nargs * sizeof(JSValueConst));
 		if (jsargs == NULL) {
 			quickjs_exception_to_python(self->runtime_data->context);
 			return NULL;
 		}
 	}
-	for (int i = 0; i < nargs; ++i) {
-		PyObject *item = PyTuple_GetItem(args, i);
-		jsargs[i] = python_to_quickjs(self->runtime_data, item);
+	for (Py_ssize_t i = 0; i < nargs; ++i) {
+		jsargs[i] = python_to_quickjs(self->runtime_data, items[i]);
 	}
 
 	prepare_call_js(self->runtime_data);
 	JSValue value;
 	value = JS_Call(self->runtime_data->context, self->object, JS_NULL, nargs, jsargs);
-	for (int i = 0; i < nargs; ++i) {
+	for (Py_ssize_t i = 0; i < nargs; ++i) {
 		JS_FreeValue(self->runtime_data->context, jsargs[i]);
 	}
-	if (nargs) {
+	if (jsargs != stack_jsargs) {
 		js_free(self->runtime_data->context, jsargs);
 	}
 	end_call_js(self->runtime_data);
 	return quickjs_to_python(self->runtime_data, value);
 }
 
+// _quickjs.Object.__call__
+static PyObject *object_call(ObjectData *self, PyObject *args, PyObject *kwds) {
+	return object_call_internal(self, &PyTuple_GET_ITEM(args, 0), PyTuple_GET_SIZE(args));
+}
+
+#if USE_VECTORCALL
+// _quickjs.Object.__call__ via vectorcall.
+//
+// Keyword arguments are ignored, like in object_call.
+static PyObject *object_vectorcall(ObjectData *self, PyObject *const *args, size_t nargsf,
+                                   PyObject *kwnames) {
+	return object_call_internal(self, args, PyVectorcall_NARGS(nargsf));
+}
+#endif
+
+// _quickjs.Object.call_with_args
+//
+// Like __call__, but takes the arguments as a single tuple or list. This saves building a new
+// tuple when the arguments are already in one.
+static PyObject *object_call_with_args(ObjectData *self, PyObject *args) {
+	PyObject *sequence = PySequence_Fast(args, "Arguments must be a tuple or a list.");
+	if (sequence == NULL) {
+		return NULL;
+	}
+	PyObject *result = object_call_internal(self, PySequence_Fast_ITEMS(sequence),
+	                                        PySequence_Fast_GET_SIZE(sequence));
+	Py_DECREF(sequence);
+	return result;
+}
+
+// Returns the name property of a thrown Javascript error (e.g. "ReferenceError") as a C string, or
+// NULL if it is not an object with a string name. Must be called between prepare_call_js and
+// end_call_js, since the property may be a getter.
+static const char *quickjs_exception_name(JSContext *context, JSValueConst exception) {
+	if (!JS_IsObject(exception)) {
+		return NULL;
+	}
+	JSValue name = JS_GetPropertyStr(context, exception, "name");
+	const char *cstring = NULL;
+	if (JS_IsString(name)) {
+		cstring = JS_ToCString(context, name);
+	} else if (JS_IsException(name)) {
+		// Do not let a throwing getter replace the original exception.
+		JS_FreeValue(context, JS_GetException(context));
+	}
+	JS_FreeValue(context, name);
+	return cstring;
+}
+
 // Converts the current Javascript exception to a Python exception via a C string.
 static void quickjs_exception_to_python(JSContext *context) {
+	RuntimeData *runtime_data = JS_GetRuntimeOpaque(JS_GetRuntime(context));
 	JSValue exception = JS_GetException(context);
+	// toString and the properties of the exception may run Javascript code.
+	prepare_call_js(runtime_data);
 	const char *cstring = JS_ToCString(context, exception);
 	const char *stack_cstring = NULL;
 	if (!JS_IsNull(exception) && !JS_IsUndefined(exception)) {
@@ -279,12 +391,35 @@ static void quickjs_exception_to_python(JSContext *context) {
 			JS_FreeValue(context, stack);
 		}
 	}
+	const char *name_cstring = quickjs_exception_name(context, exception);
+	end_call_js(runtime_data);
 	if (cstring != NULL) {
 		const char *safe_stack_cstring = stack_cstring ? stack_cstring : "";
-		if (strstr(cstring, "stack overflow") != NULL) {
-			PyErr_Format(StackOverflow, "%s\n%s", cstring, safe_stack_cstring);
-		} else {
-			PyErr_Format(JSException, "%s\n%s", cstring, safe_stack_cstring);
+		PyObject *type = strstr(cstring, "stack overflow") != NULL ? StackOverflow : JSException;
+		// Replaces any Python exception left by a failed call into Python, like PyErr_Format.
+		PyErr_Clear();
+		PyObject *message = PyUnicode_FromFormat("%s\n%s", cstring, safe_stack_cstring);
+		PyObject *error = NULL;
+		if (message != NULL) {
+			error = PyObject_CallFunctionObjArgs(type, message, NULL);
+			Py_DECREF(message);
+		}
+		if (error != NULL) {
+			// The name of the Javascript error, so that it can be checked without parsing the
+			// message.
+			PyObject *error_name = Py_None;
+			Py_INCREF(error_name);
+			if (name_cstring != NULL) {
+				Py_SETREF(error_name, PyUnicode_FromString(name_cstring));
+			}
+			if (error_name == NULL || PyObject_SetAttrString(error, "error_name", error_name) != 0) {
+				Py_CLEAR(error);
+			}
+			Py_XDECREF(error_name);
+		}
+		if (error != NULL) {
+			PyErr_SetObject(type, error);
+			Py_DECREF(error);
 		}
 	} else {
 		// This has been observed to happen when different threads have used the same QuickJS
@@ -295,9 +430,37 @@ static void quickjs_exception_to_python(JSContext *context) {
 	}
 	JS_FreeCString(context, cstring);
 	JS_FreeCString(context, stack_cstring);
+	JS_FreeCString(context, name_cstring);
 	JS_FreeValue(context, exception);
 }
 
+// Converts a Javascript string to a Python str. Does not take ownership of the JSValue.
+static PyObject *quickjs_string_to_python(JSContext *context, JSValueConst value) {
+	size_t length;
+	const char *cstring = JS_ToCStringLen(context, &length, value);
+	if (cstring == NULL) {
+		quickjs_exception_to_python(context);
+		return NULL;
+	}
+	// Short ASCII strings are common and can be copied without decoding.
+	int ascii = length <= 64;
+	for (size_t i = 0; ascii && i < length; ++i) {
+		ascii = (unsigned char)cstring[i] < 128;
+	}
+	PyObject *result;
+	if (ascii) {
+		result = PyUnicode_New(length, 127);
+		if (result != NULL) {
+			memcpy(PyUnicode_1BYTE_DATA(result), cstring, length);
+		}
+	} else {
+		// Lone surrogates are encoded like other code points, as JSON.parse in Python accepts them.
+		result = PyUnicode_DecodeUTF8(cstring, length, "surrogatepass");
+	}
+	JS_FreeCString(context, cstring);
+	return result;
+}
+
 // Converts a JSValue to a Python object.
 //
 // Takes ownership of the JSValue and will deallocate it (refcount reduced by 1).
@@ -308,13 +471,13 @@ static PyObject *quickjs_to_python(RuntimeData *runtime_data, JSValue value) {
 	PyObject *return_value = NULL;
 
 	if (tag == JS_TAG_INT) {
-		return_value = Py_BuildValue("i", JS_VALUE_GET_INT(value));
+		return_value = PyLong_FromLong(JS_VALUE_GET_INT(value));
 	} else if (tag == JS_TAG_BIG_INT) {
 		const char *cstring = JS_ToCString(context, value);
 		return_value = PyLong_FromString(cstring, NULL, 10);
 		JS_FreeCString(context, cstring);
 	} else if (tag == JS_TAG_BOOL) {
-		return_value = Py_BuildValue("O", JS_VALUE_GET_BOOL(value) ? Py_True : Py_False);
+		return_value = PyBool_FromLong(JS_VALUE_GET_BOOL(value));
 	} else if (tag == JS_TAG_NULL) {
 		return_value = Py_None;
 	} else if (tag == JS_TAG_UNDEFINED) {
@@ -322,11 +485,9 @@ static PyObject *quickjs_to_python(RuntimeData *runtime_data, JSValue value) {
 	} else if (tag == JS_TAG_EXCEPTION) {
 		quickjs_exception_to_python(context);
 	} else if (tag == JS_TAG_FLOAT64) {
-		return_value = Py_BuildValue("d", JS_VALUE_GET_FLOAT64(value));
+		return_value = PyFloat_FromDouble(JS_VALUE_GET_FLOAT64(value));
 	} else if (tag == JS_TAG_STRING) {
-		const char *cstring = JS_ToCString(context, value);
-		return_value = Py_BuildValue("s", cstring);
-		JS_FreeCString(context, cstring);
+		return_value = quickjs_string_to_python(context, value);
 	} else if (tag == JS_TAG_OBJECT || tag == JS_TAG_MODULE || tag == JS_TAG_SYMBOL) {
 		// This is a Javascript object or function. We wrap it in a _quickjs.Object.
 		return_value = PyObject_CallObject((PyObject *)&Object, NULL);
@@ -349,6 +510,288 @@ static PyObject *quickjs_to_python(RuntimeData *runtime_data, JSValue value) {
 	return return_value;
 }
 
+// State of a conversion done by _quickjs.Object.to_python.
+typedef struct {
+	RuntimeData *runtime_data;
+	// The objects currently being converted. Used to detect cycles, which JSON.stringify does not
+	// allow either.
+	void **path;
+	int path_length;
+	int path_capacity;
+} DeepConversion;
+
+static PyObject *quickjs_to_python_deep(DeepConversion *conversion, JSValueConst value,
+                                        JSAtom key, int *omit);
+
+// Converts the elements of a JS array to a Python list.
+static PyObject *quickjs_array_to_python(DeepConversion *conversion, JSValueConst value) {
+	RuntimeData *runtime_data = conversion->runtime_data;
+	JSContext *context = runtime_data->context;
+	int64_t length;
+	// The length and the elements may be getters.
+	prepare_call_js(runtime_data);
+	JSValue js_length = JS_GetPropertyStr(context, value, "length");
+	int ret = JS_ToInt64(context, &length, js_length);
+	end_call_js(runtime_data);
+	JS_FreeValue(context, js_length);
+	if (ret < 0) {
+		quickjs_exception_to_python(context);
+		return NULL;
+	}
+	// Like ToLength in JSON.stringify.
+	if (length < 0) {
+		length = 0;
+	}
+	PyObject *list = PyList_New(length);
+	if (list == NULL) {
+		return NULL;
+	}
+	for (int64_t i = 0; i < length; ++i) {
+		JSAtom index;
+		if (i <= UINT32_MAX) {
+			index = JS_NewAtomUInt32(context, (uint32_t)i);
+		} else {
+			char index_string[24];
+			snprintf(index_string, sizeof(index_string), "%" PRId64, i);
+			index = JS_NewAtom(context, index_string);
+		}
+		prepare_call_js(runtime_data);
+		JSValue item = JS_GetProperty(context, value, index);
+		end_call_js(runtime_data);
+		if (JS_IsException(item)) {
+			JS_FreeAtom(context, index);
+			quickjs_exception_to_python(context);
+			Py_DECREF(list);
+			return NULL;
+		}
+		// Omitted values become null in JSON arrays.
+		int omit;
+		PyObject *py_item = quickjs_to_python_deep(conversion, item, index, &omit);
+		JS_FreeAtom(context, index);
+		JS_FreeValue(context, item);
+		if (py_item == NULL) {
+			Py_DECREF(list);
+			return NULL;
+		}
+		PyList_SET_ITEM(list, i, py_item);
+	}
+	return list;
+}
+
+// Converts the own enumerable properties of a JS object to a Python dict.
+static PyObject *quickjs_object_to_python(DeepConversion *conversion, JSValueConst value) {
+	RuntimeData *runtime_data = conversion->runtime_data;
+	JSContext *context = runtime_data->context;
+	JSPropertyEnum *properties;
+	uint32_t num_properties;
+	// Proxy traps and getters may run.
+	prepare_call_js(runtime_data);
+	int ret = JS_GetOwnPropertyNames(context, &properties, &num_properties, value,
+	                                 JS_GPN_STRING_MASK | JS_GPN_ENUM_ONLY);
+	end_call_js(runtime_data);
+	if (ret < 0) {
+		quickjs_exception_to_python(context);
+		return NULL;
+	}
+	PyObject *dict = PyDict_New();
+	for (uint32_t i = 0; i < num_properties && dict != NULL; ++i) {
+		prepare_call_js(runtime_data);
+		JSValue item = JS_GetProperty(context, value, properties[i].atom);
+		end_call_js(runtime_data);
+		if (JS_IsException(item)) {
+			quickjs_exception_to_python(context);
+			Py_CLEAR(dict);
+			break;
+		}
+		int omit;
+		PyObject *py_item =
+		    quickjs_to_python_deep(conversion, item, properties[i].atom, &omit);
+		JS_FreeValue(context, item);
+		if (py_item == NULL) {
+			Py_CLEAR(dict);
+			break;
+		}
+		if (!omit) {
+			PyObject *key = quickjs_to_python(conversion->runtime_data,
+			                                  JS_AtomToString(context, properties[i].atom));
+			if (key == NULL || PyDict_SetItem(dict, key, py_item) != 0) {
+				Py_CLEAR(dict);
+			}
+			Py_XDECREF(key);
+		}
+		Py_DECREF(py_item);
+	}
+	for (uint32_t i = 0; i < num_properties; ++i) {
+		JS_FreeAtom(context, properties[i].atom);
+	}
+	js_free(context, properties);
+	return dict;
+}
+
+// Objects other than plain objects and arrays have their own rules in JSON.stringify, e.g. boxed
+// primitives like new Number(5). Those are converted by a round trip through JSON. Sets *replaced
+// to 0 and returns JS_UNDEFINED for plain objects and arrays. Must be called between
+// prepare_call_js and end_call_js.
+static JSValue quickjs_json_round_trip(RuntimeData *runtime_data, JSValueConst value,
+                                       int *replaced) {
+	JSContext *context = runtime_data->context;
+	*replaced = 0;
+	JSValue class_name = JS_Call(context, runtime_data->object_to_string, value, 0, NULL);
+	if (JS_IsException(class_name)) {
+		return class_name;
+	}
+	const char *cstring = JS_ToCString(context, class_name);
+	JS_FreeValue(context, class_name);
+	if (cstring == NULL) {
+		return JS_EXCEPTION;
+	}
+	int is_number = strcmp(cstring, "[object Number]") == 0;
+	*replaced = strcmp(cstring, "[object Object]") != 0 && strcmp(cstring, "[object Array]") != 0;
+	JS_FreeCString(context, cstring);
+	if (!*replaced) {
+		return JS_UNDEFINED;
+	}
+	if (is_number) {
+		// JSON.stringify writes boxed NaN and Infinity as is, which JSON.parse does not accept.
+		// The class name can be set with Symbol.toStringTag, so check it with the builtin valueOf.
+		JSValue number = JS_Call(context, runtime_data->number_value_of, value, 0, NULL);
+		if (!JS_IsException(number)) {
+			double converted;
+			JS_FreeValue(context, number);
+			// Like JSON.stringify, use the valueOf of the object itself.
+			if (JS_ToFloat64(context, &converted, value) < 0) {
+				return JS_EXCEPTION;
+			}
+			return JS_NewFloat64(context, converted);
+		}
+		JS_FreeValue(context, JS_GetException(context));
+	}
+	JSValue json = JS_JSONStringify(context, value, JS_UNDEFINED, JS_UNDEFINED);
+	if (!JS_IsString(json)) {
+		// An exception or undefined.
+		return json;
+	}
+	size_t length;
+	cstring = JS_ToCStringLen(context, &length, json);
+	JS_FreeValue(context, json);
+	if (cstring == NULL) {
+		return JS_EXCEPTION;
+	}
+	JSValue result = JS_ParseJSON(context, cstring, length, "<json>");
+	JS_FreeCString(context, cstring);
+	return result;
+}
+
+// Converts a JSValue recursively to Python objects, following the rules of JSON.stringify. key
+// is the property name or array index of the value, which is passed to toJSON.
+//
+// Does not take ownership of the JSValue. Sets omit to 1 if the value would be left out of a JSON
+// object (undefined, functions and symbols), in which case None is returned.
+static PyObject *quickjs_to_python_deep(DeepConversion *conversion, JSValueConst value,
+                                        JSAtom key, int *omit) {
+	RuntimeData *runtime_data = conversion->runtime_data;
+	JSContext *context = runtime_data->context;
+	int tag = JS_VALUE_GET_TAG(value);
+	*omit = 0;
+
+	if (tag == JS_TAG_UNDEFINED || tag == JS_TAG_SYMBOL ||
+	    (tag == JS_TAG_OBJECT && JS_IsFunction(context, value))) {
+		*omit = 1;
+		Py_RETURN_NONE;
+	} else if (tag == JS_TAG_FLOAT64) {
+		double number = JS_VALUE_GET_FLOAT64(value);
+		if (!isfinite(number)) {
+			Py_RETURN_NONE;
+		} else if (number == floor(number) && fabs(number) < 1e21) {
+			// JSON.stringify writes these without a fractional part.
+			return PyLong_FromDouble(number);
+		}
+		return PyFloat_FromDouble(number);
+	} else if (tag != JS_TAG_OBJECT) {
+		return quickjs_to_python(runtime_data, JS_DupValue(context, value));
+	}
+
+	// E.g. Date has toJSON, which is called with the key. Getters may run.
+	prepare_call_js(runtime_data);
+	int replaced = 1;
+	JSValue replacement;
+	JSValue to_json = JS_GetPropertyStr(context, value, "toJSON");
+	if (JS_IsException(to_json)) {
+		replacement = JS_EXCEPTION;
+	} else if (JS_IsFunction(context, to_json)) {
+		JSValue key_string = JS_AtomToString(context, key);
+		replacement = JS_Call(context, to_json, value, 1, (JSValueConst *)&key_string);
+		JS_FreeValue(context, key_string);
+	} else {
+		replacement = quickjs_json_round_trip(runtime_data, value, &replaced);
+	}
+	JS_FreeValue(context, to_json);
+	end_call_js(runtime_data);
+	if (JS_IsException(replacement)) {
+		quickjs_exception_to_python(context);
+		return NULL;
+	} else if (replaced) {
+		PyObject *result = quickjs_to_python_deep(conversion, replacement, key, omit);
+		JS_FreeValue(context, replacement);
+		return result;
+	}
+
+	void *pointer = JS_VALUE_GET_PTR(value);
+	for (int i = 0; i < conversion->path_length; ++i) {
+		if (conversion->path[i] == pointer) {
+			PyErr_Format(JSException, "TypeError: circular reference");
+			return NULL;
+		}
+	}
+	if (conversion->path_length == conversion->path_capacity) {
+		int capacity = 2 * conversion->path_capacity + 16;
+		void **path = PyMem_Realloc(conversion->path, capacity * sizeof(void *));
+		if (path == NULL) {
+			return PyErr_NoMemory();
+		}
+		conversion->path = path;
+		conversion->path_capacity = capacity;
+	}
+	if (Py_EnterRecursiveCall(" while converting a JS object to Python")) {
+		return NULL;
+	}
+	conversion->path[conversion->path_length++] = pointer;
+
+	PyObject *result = NULL;
+	prepare_call_js(runtime_data);
+	int is_array = JS_IsArray(context, value);
+	end_call_js(runtime_data);
+	if (is_array < 0) {
+		quickjs_exception_to_python(context);
+	} else if (is_array) {
+		result = quickjs_array_to_python(conversion, value);
+	} else {
+		result = quickjs_object_to_python(conversion, value);
+	}
+
+	conversion->path_length--;
+	Py_LeaveRecursiveCall();
+	return result;
+}
+
+// _quickjs.Object.to_python
+//
+// Converts the object to Python objects directly, without going through a JSON string.
+static PyObject *object_to_python(ObjectData *self) {
+	if (self->runtime_data == NULL) {
+		Py_RETURN_NONE;
+	}
+	DeepConversion conversion = {self->runtime_data, NULL, 0, 0};
+	JSContext *context = self->runtime_data->context;
+	// JSON.stringify calls toJSON of the outermost value with the empty string.
+	JSAtom key = JS_NewAtom(context, "");
+	int omit;
+	PyObject *result = quickjs_to_python_deep(&conversion, self->object, key, &omit);
+	JS_FreeAtom(context, key);
+	PyMem_Free(conversion.path);
+	return result;
+}
+
 static PyObject *test(PyObject *self, PyObject *args) {
 	return Py_BuildValue("i", 42);
 }
@@ -467,8 +910,16 @@ static JSClassDef js_python_function_class = {
 static PyObject *runtime_new(PyTypeObject *type, PyObject *args, PyObject *kwds) {
 	RuntimeData *self = PyObject_GC_New(RuntimeData, type);
 	if (self != NULL) {
+		self->eval_cache = PyDict_New();
+		if (self->eval_cache == NULL) {
+			PyObject_GC_Del(self);
+			return NULL;
+		}
 		// We never have different contexts for the same runtime. This way, different
 		// _quickjs.Context can be used concurrently.
+		//
+		// Most of the time here is spent creating the builtin objects of the context. Contexts
+		// are not reused, since scripts can modify any builtin object.
 		self->runtime = JS_NewRuntime();
 		self->context = JS_NewContext(self->runtime);
 		JS_NewClass(self->runtime, js_python_function_class_id,
@@ -478,7 +929,18 @@ static PyObject *runtime_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 		JSValue fct_proto = JS_GetPropertyStr(self->context, fct_cls, "prototype");
 		JS_FreeValue(self->context, fct_cls);
 		JS_SetClassProto(self->context, js_python_function_class_id, fct_proto);
+		JSValue object_cls = JS_GetPropertyStr(self->context, global, "Object");
+		JSValue object_proto = JS_GetPropertyStr(self->context, object_cls, "prototype");
+		self->object_to_string = JS_GetPropertyStr(self->context, object_proto, "toString");
+		JS_FreeValue(self->context, object_proto);
+		JS_FreeValue(self->context, object_cls);
+		JSValue number_cls = JS_GetPropertyStr(self->context, global, "Number");
+		JSValue number_proto = JS_GetPropertyStr(self->context, number_cls, "prototype");
+		self->number_value_of = JS_GetPropertyStr(self->context, number_proto, "valueOf");
+		JS_FreeValue(self->context, number_proto);
+		JS_FreeValue(self->context, number_cls);
 		JS_FreeValue(self->context, global);
+		self->has_memory_limit = 0;
 		self->has_time_limit = 0;
 		self->time_limit = 0;
 		self->thread_state = NULL;
@@ -491,6 +953,10 @@ static PyObject *runtime_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 
 // Deallocates an instance of the _quickjs.Context class.
 static void runtime_dealloc(RuntimeData *self) {
+	// The cached functions need the context to be freed.
+	Py_CLEAR(self->eval_cache);
+	JS_FreeValue(self->context, self->object_to_string);
+	JS_FreeValue(self->context, self->number_value_of);
 	JS_FreeContext(self->context);
 	JS_FreeRuntime(self->runtime);
 	PyObject_GC_UnTrack(self);
@@ -500,23 +966,306 @@ static void runtime_dealloc(RuntimeData *self) {
 // Evaluates a Python string as JS and returns the result as a Python object. Will return
 // _quickjs.Object for complex types (other than e.g. str, int).
 static PyObject *runtime_eval_internal(RuntimeData *self, PyObject *args, int eval_type) {
-	const char *code;
-	if (!PyArg_ParseTuple(args, "s", &code)) {
+	PyObject *code_object;
+	if (!PyArg_ParseTuple(args, "U", &code_object)) {
+		return NULL;
+	}
+	Py_ssize_t length;
+	const char *code = PyUnicode_AsUTF8AndSize(code_object, &length);
+	if (code == NULL) {
 		return NULL;
 	}
 	prepare_call_js(self);
-	JSValue value;
-	value = JS_Eval(self->context, code, strlen(code), "<input>", eval_type);
+	JSValue value = JS_Eval(self->context, code, length, "<input>", eval_type);
+	end_call_js(self);
+	return quickjs_to_python(self, value);
+}
+
+// Frees a compiled function stored in the eval cache.
+static void eval_cache_capsule_destructor(PyObject *capsule) {
+	JSValue *function = PyCapsule_GetPointer(capsule, EVAL_CACHE_CAPSULE_NAME);
+	JS_FreeValue(PyCapsule_GetContext(capsule), *function);
+	PyMem_Free(function);
+}
+
+// Stores a compiled function in the eval cache. Takes ownership of the function.
+//
+// Failing to store it is not an error, since the cache is only an optimization.
+static void eval_cache_store(RuntimeData *self, PyObject *code, JSValue function) {
+	JSValue *pointer = PyMem_Malloc(sizeof(JSValue));
+	if (pointer == NULL) {
+		JS_FreeValue(self->context, function);
+		return;
+	}
+	*pointer = function;
+	PyObject *capsule =
+	    PyCapsule_New(pointer, EVAL_CACHE_CAPSULE_NAME, eval_cache_capsule_destructor);
+	if (capsule == NULL) {
+		JS_FreeValue(self->context, function);
+		PyMem_Free(pointer);
+		PyErr_Clear();
+		return;
+	}
+	PyCapsule_SetContext(capsule, self->context);
+	if (PyDict_GET_SIZE(self->eval_cache) >= EVAL_CACHE_SIZE) {
+		// Dicts are ordered, so the first key is the oldest.
+		Py_ssize_t pos = 0;
+		PyObject *oldest_code;
+		PyObject *oldest_capsule;
+		if (PyDict_Next(self->eval_cache, &pos, &oldest_code, &oldest_capsule)) {
+			Py_INCREF(oldest_code);
+			PyDict_DelItem(self->eval_cache, oldest_code);
+			Py_DECREF(oldest_code);
+		}
+	}
+	if (PyDict_SetItem(self->eval_cache, code, capsule) != 0) {
+		PyErr_Clear();
+	}
+	Py_DECREF(capsule);
+}
+
+// Looks up code in the eval cache. Sets *function to a new reference to the cached compiled
+// function, or to JS_UNDEFINED if there is none. Returns -1 on error.
+static int eval_cache_lookup(RuntimeData *self, PyObject *code, JSValue *function) {
+	*function = JS_UNDEFINED;
+	// QuickJS crashes if it runs out of memory while creating the error for running out of
+	// memory, which may happen when running code with a memory limit. Parsing runs into the
+	// limit before that, so the cache is not used when there is one.
+	if (self->has_memory_limit) {
+		return 0;
+	}
+	// Strings cache their hash and dict lookups compare identity before contents, so evaluating
+	// the same string object again costs about as much as a pointer-keyed table would.
+	PyObject *capsule = PyDict_GetItemWithError(self->eval_cache, code);
+	if (capsule == NULL) {
+		return PyErr_Occurred() ? -1 : 0;
+	}
+	JSValue *cached = PyCapsule_GetPointer(capsule, EVAL_CACHE_CAPSULE_NAME);
+	*function = JS_DupValue(self->context, *cached);
+	return 0;
+}
+
+// Runs code, compiling it first unless function is an already compiled version of it. Must be
+// called between prepare_call_js and end_call_js.
+//
+// Takes ownership of function. A newly compiled function that should be added to the eval cache
+// is returned in *function_to_cache; otherwise it is left as JS_UNDEFINED.
+static JSValue eval_function(RuntimeData *self, const char *code, Py_ssize_t length,
+                             JSValue function, JSValue *function_to_cache) {
+	if (JS_IsUndefined(function)) {
+		function = JS_Eval(self->context, code, length, "<input>",
+		                   JS_EVAL_TYPE_GLOBAL | JS_EVAL_FLAG_COMPILE_ONLY);
+		if (JS_IsException(function)) {
+			return function;
+		}
+		if (!self->has_memory_limit) {
+			*function_to_cache = JS_DupValue(self->context, function);
+		}
+	}
+	return JS_EvalFunction(self->context, function);
+}
+
+// Evaluates code_object, a Python string, as JS using the eval cache.
+static PyObject *runtime_eval_string(RuntimeData *self, PyObject *code_object) {
+	Py_ssize_t length;
+	const char *code = PyUnicode_AsUTF8AndSize(code_object, &length);
+	if (code == NULL) {
+		return NULL;
+	}
+	JSValue function;
+	if (eval_cache_lookup(self, code_object, &function) != 0) {
+		return NULL;
+	}
+	JSValue function_to_cache = JS_UNDEFINED;
+	prepare_call_js(self);
+	JSValue value = eval_function(self, code, length, function, &function_to_cache);
 	end_call_js(self);
+
+	if (!JS_IsUndefined(function_to_cache)) {
+		eval_cache_store(self, code_object, function_to_cache);
+	}
 	return quickjs_to_python(self, value);
 }
 
+static int is_ascii_space(char c) {
+	return c == ' ' || c == '\t' || c == '\n' || c == '\r' || c == '\v' || c == '\f';
+}
+
+// Returns the value of code if it is just one of the literals null, undefined, true or false,
+// possibly surrounded by whitespace. Returns NULL otherwise, without setting an exception.
+static PyObject *eval_literal(const char *code, Py_ssize_t length) {
+	while (length > 0 && is_ascii_space(code[0])) {
+		++code;
+		--length;
+	}
+	while (length > 0 && is_ascii_space(code[length - 1])) {
+		--length;
+	}
+	if ((length == 4 && memcmp(code, "null", 4) == 0) ||
+	    (length == 9 && memcmp(code, "undefined", 9) == 0)) {
+		Py_RETURN_NONE;
+	} else if (length == 4 && memcmp(code, "true", 4) == 0) {
+		Py_RETURN_TRUE;
+	} else if (length == 5 && memcmp(code, "false", 5) == 0) {
+		Py_RETURN_FALSE;
+	}
+	return NULL;
+}
+
 // _quickjs.Context.eval
 //
 // Evaluates a Python string as JS and returns the result as a Python object. Will return
 // _quickjs.Object for complex types (other than e.g. str, int).
+//
+// The compiled code is cached, so evaluating the same string again only runs it.
 static PyObject *runtime_eval(RuntimeData *self, PyObject *args) {
-	return runtime_eval_internal(self, args, JS_EVAL_TYPE_GLOBAL);
+	PyObject *code_object;
+	if (!PyArg_ParseTuple(args, "U", &code_object)) {
+		return NULL;
+	}
+	// These literals are common enough to skip QuickJS for. The global undefined can not be
+	// redefined.
+	if (PyUnicode_GET_LENGTH(code_object) <= 32) {
+		Py_ssize_t length;
+		const char *code = PyUnicode_AsUTF8AndSize(code_object, &length);
+		if (code == NULL) {
+			return NULL;
+		}
+		PyObject *literal = eval_literal(code, length);
+		if (literal != NULL) {
+			return literal;
+		}
+	}
+	return runtime_eval_string(self, code_object);
+}
+
+// _quickjs.Context.eval_expr
+//
+// Like eval, but the string must be a single expression. Code like "{}" is then an object
+// literal instead of an empty block.
+static PyObject *runtime_eval_expr(RuntimeData *self, PyObject *args) {
+	PyObject *code_object;
+	if (!PyArg_ParseTuple(args, "U", &code_object)) {
+		return NULL;
+	}
+	// The newline ends a trailing line comment.
+	PyObject *expression = PyUnicode_FromFormat("(%U\n)", code_object);
+	if (expression == NULL) {
+		return NULL;
+	}
+	PyObject *result = runtime_eval_string(self, expression);
+	Py_DECREF(expression);
+	return result;
+}
+
+// One source string passed to _quickjs.Context.eval_many.
+typedef struct {
+	const char *code;
+	Py_ssize_t length;
+	JSValue function;
+	JSValue function_to_cache;
+	JSValue value;
+} EvalItem;
+
+// _quickjs.Context.eval_many
+//
+// Evaluates a sequence of Python strings as JS, in order, and returns a list of the results.
+// All of them are run without returning to Python in between, so the time limit applies to the
+// whole batch. Stops at the first error and raises it.
+static PyObject *runtime_eval_many(RuntimeData *self, PyObject *sources) {
+	if (!PyList_Check(sources) && !PyTuple_Check(sources)) {
+		PyErr_Format(PyExc_TypeError, "Sources must be a list or a tuple.");
+		return NULL;
+	}
+	// A copy, since Python functions called from the Javascript code may modify a list. The
+	// strings it refers to own the UTF-8 data used while running.
+	PyObject *sequence = PySequence_Tuple(sources);
+	if (sequence == NULL) {
+		return NULL;
+	}
+	PyObject **codes = PySequence_Fast_ITEMS(sequence);
+	Py_ssize_t count = PyTuple_GET_SIZE(sequence);
+	EvalItem *items = PyMem_Calloc(count > 0 ? count : 1, sizeof(EvalItem));
+	if (items == NULL) {
+		Py_DECREF(sequence);
+		return PyErr_NoMemory();
+	}
+
+	Py_ssize_t looked_up = 0;
+	for (; looked_up < count; ++looked_up) {
+		EvalItem *item = &items[looked_up];
+		item->function_to_cache = JS_UNDEFINED;
+		if (!PyUnicode_Check(codes[looked_up])) {
+			PyErr_Format(PyExc_TypeError, "Sources must be strings.");
+			break;
+		}
+		item->code = PyUnicode_AsUTF8AndSize(codes[looked_up], &item->length);
+		if (item->code == NULL ||
+		    eval_cache_lookup(self, codes[looked_up], &item->function) != 0) {
+			break;
+		}
+	}
+	if (looked_up < count) {
+		for (Py_ssize_t i = 0; i < looked_up; ++i) {
+			JS_FreeValue(self->context, items[i].function);
+		}
+		PyMem_Free(items);
+		Py_DECREF(sequence);
+		return NULL;
+	}
+
+	Py_ssize_t evaluated = 0;
+	int failed = 0;
+	prepare_call_js(self);
+	while (evaluated < count && !failed) {
+		EvalItem *item = &items[evaluated++];
+		item->value = eval_function(self, item->code, item->length, item->function,
+		                            &item->function_to_cache);
+		failed = JS_IsException(item->value);
+	}
+	end_call_js(self);
+
+	for (Py_ssize_t i = 0; i < count; ++i) {
+		if (i >= evaluated) {
+			JS_FreeValue(self->context, items[i].function);
+		} else if (!JS_IsUndefined(items[i].function_to_cache)) {
+			eval_cache_store(self, codes[i], items[i].function_to_cache);
+		}
+	}
+
+	PyObject *result = NULL;
+	if (failed) {
+		// Raises the exception.
+		quickjs_to_python(self, items[evaluated - 1].value);
+		for (Py_ssize_t i = 0; i < evaluated - 1; ++i) {
+			JS_FreeValue(self->context, items[i].value);
+		}
+	} else {
+		result = PyList_New(count);
+		Py_ssize_t i = 0;
+		for (; result != NULL && i < count; ++i) {
+			PyObject *value = quickjs_to_python(self, items[i].value);
+			if (value == NULL) {
+				Py_CLEAR(result);
+			} else {
+				PyList_SET_ITEM(result, i, value);
+			}
+		}
+		for (; i < count; ++i) {
+			JS_FreeValue(self->context, items[i].value);
+		}
+	}
+	PyMem_Free(items);
+	Py_DECREF(sequence);
+	return result;
+}
+
+// _quickjs.Context.eval_cache_clear
+//
+// Removes all compiled code cached by eval.
+static PyObject *runtime_eval_cache_clear(RuntimeData *self) {
+	PyDict_Clear(self->eval_cache);
+	Py_RETURN_NONE;
 }
 
 // _quickjs.Context.module
@@ -526,6 +1275,57 @@ static PyObject *runtime_module(RuntimeData *self, PyObject *args) {
 	return runtime_eval_internal(self, args, JS_EVAL_TYPE_MODULE);
 }
 
+// _quickjs.Context.compile
+//
+// Compiles a Python string as a JS script without running it and returns the bytecode as bytes.
+static PyObject *runtime_compile(RuntimeData *self, PyObject *args) {
+	const char *code;
+	Py_ssize_t length;
+	if (!PyArg_ParseTuple(args, "s#", &code, &length)) {
+		return NULL;
+	}
+	prepare_call_js(self);
+	JSValue function = JS_Eval(self->context, code, length, "<input>",
+	                           JS_EVAL_TYPE_GLOBAL | JS_EVAL_FLAG_COMPILE_ONLY);
+	end_call_js(self);
+	if (JS_IsException(function)) {
+		quickjs_exception_to_python(self->context);
+		return NULL;
+	}
+	size_t size;
+	uint8_t *bytecode = JS_WriteObject(self->context, &size, function, JS_WRITE_OBJ_BYTECODE);
+	JS_FreeValue(self->context, function);
+	if (bytecode == NULL) {
+		quickjs_exception_to_python(self->context);
+		return NULL;
+	}
+	PyObject *result = PyBytes_FromStringAndSize((const char *)bytecode, size);
+	js_free(self->context, bytecode);
+	return result;
+}
+
+// _quickjs.Context.eval_bytecode
+//
+// Runs bytecode returned by compile and returns the result like eval does. The bytecode is not
+// validated, so it must come from compile of the same version of this module.
+//
+// Any bytes-like object is accepted, so the bytecode can e.g. be read with mmap without copying.
+static PyObject *runtime_eval_bytecode(RuntimeData *self, PyObject *args) {
+	Py_buffer bytecode;
+	if (!PyArg_ParseTuple(args, "y*", &bytecode)) {
+		return NULL;
+	}
+	prepare_call_js(self);
+	JSValue value = JS_ReadObject(self->context, (const uint8_t *)bytecode.buf, bytecode.len,
+	                              JS_READ_OBJ_BYTECODE);
+	if (!JS_IsException(value)) {
+		value = JS_EvalFunction(self->context, value);
+	}
+	end_call_js(self);
+	PyBuffer_Release(&bytecode);
+	return quickjs_to_python(self, value);
+}
+
 // _quickjs.Context.execute_pending_job
 //
 // If there are pending jobs, executes one and returns True. Else returns False.
@@ -550,13 +1350,14 @@ static PyObject *runtime_execute_pending_job(RuntimeData *self) {
 // return _quickjs.Object for complex types (other than e.g. str, int).
 static PyObject *runtime_parse_json(RuntimeData *self, PyObject *args) {
 	const char *data;
-	if (!PyArg_ParseTuple(args, "s", &data)) {
+	Py_ssize_t length;
+	if (!PyArg_ParseTuple(args, "s#", &data, &length)) {
 		return NULL;
 	}
-	JSValue value;
-	Py_BEGIN_ALLOW_THREADS;
-	value = JS_ParseJSON(self->context, data, strlen(data), "runtime_parse_json.json");
-	Py_END_ALLOW_THREADS;
+	// Parsing may run the garbage collector, which can free Python functions.
+	prepare_call_js(self);
+	JSValue value = JS_ParseJSON(self->context, data, length, "runtime_parse_json.json");
+	end_call_js(self);
 	return quickjs_to_python(self, value);
 }
 
@@ -569,7 +1370,10 @@ static PyObject *runtime_get(RuntimeData *self, PyObject *args) {
 		return NULL;
 	}
 	JSValue global = JS_GetGlobalObject(self->context);
+	// The property may be a getter.
+	prepare_call_js(self);
 	JSValue value = JS_GetPropertyStr(self->context, global, name);
+	end_call_js(self);
 	JS_FreeValue(self->context, global);
 	return quickjs_to_python(self, value);
 }
@@ -586,7 +1390,11 @@ static PyObject *runtime_set(RuntimeData *self, PyObject *args) {
 	JSValue global = JS_GetGlobalObject(self->context);
 	int ret = 0;
 	if (python_to_quickjs_possible(self, item)) {
-		ret = JS_SetPropertyStr(self->context, global, name, python_to_quickjs(self, item));
+		JSValue value = python_to_quickjs(self, item);
+		// The property may be a setter.
+		prepare_call_js(self);
+		ret = JS_SetPropertyStr(self->context, global, name, value);
+		end_call_js(self);
 		if (ret != 1) {
 			PyErr_SetString(PyExc_TypeError, "Failed setting the variable.");
 		}
@@ -608,6 +1416,8 @@ static PyObject *runtime_set_memory_limit(RuntimeData *self, PyObject *args) {
 		return NULL;
 	}
 	JS_SetMemoryLimit(self->runtime, limit);
+	// A negative limit is the same as no limit.
+	self->has_memory_limit = limit >= 0;
 	Py_RETURN_NONE;
 }
 
@@ -691,7 +1501,10 @@ static PyObject *runtime_memory(RuntimeData *self) {
 //
 // Runs garbage collection.
 static PyObject *runtime_gc(RuntimeData *self) {
+	// Collecting a large heap takes a while, so other Python threads may run meanwhile.
+	prepare_call_js(self);
 	JS_RunGC(self->runtime);
+	end_call_js(self);
 	Py_RETURN_NONE;
 }
 
@@ -758,10 +1571,30 @@ static PyObject *runtime_global_this(RuntimeData *self, void *closure) {
 // All methods of the _quickjs.Context class.
 static PyMethodDef runtime_methods[] = {
     {"eval", (PyCFunction)runtime_eval, METH_VARARGS, "Evaluates a Javascript string."},
+    {"eval_expr",
+     (PyCFunction)runtime_eval_expr,
+     METH_VARARGS,
+     "Evaluates a Javascript string containing a single expression."},
+    {"eval_many",
+     (PyCFunction)runtime_eval_many,
+     METH_O,
+     "Evaluates a list of Javascript strings and returns a list of the results."},
+    {"eval_cache_clear",
+     (PyCFunction)runtime_eval_cache_clear,
+     METH_NOARGS,
+     "Removes all compiled code cached by eval."},
     {"module",
      (PyCFunction)runtime_module,
      METH_VARARGS,
      "Evaluates a Javascript string as a module."},
+    {"compile",
+     (PyCFunction)runtime_compile,
+     METH_VARARGS,
+     "Compiles a Javascript string to bytecode without running it."},
+    {"eval_bytecode",
+     (PyCFunction)runtime_eval_bytecode,
+     METH_VARARGS,
+     "Runs bytecode returned by compile."},
     {"execute_pending_job", (PyCFunction)runtime_execute_pending_job, METH_NOARGS, "Executes a pending job."},
     {"parse_json", (PyCFunction)runtime_parse_json, METH_VARARGS, "Parses a JSON string."},
     {"get", (PyCFunction)runtime_get, METH_VARARGS, "Gets a Javascript global variable."},
@@ -831,6 +1664,12 @@ PyMODINIT_FUNC PyInit__quickjs(void) {
 	if (module == NULL) {
 		return NULL;
 	}
+#ifdef Py_GIL_DISABLED
+	// A context must only be used from one thread at a time even with the GIL, since it is
+	// released while running JS. quickjs.Function takes care of that, so free-threaded Python
+	// does not need to enable the GIL for this module.
+	PyUnstable_Module_SetGIL(module, Py_MOD_GIL_NOT_USED);
+#endif
 
 	JS_NewClassID(&js_python_function_class_id);
 
@@ -1,10 +1,27 @@
 import concurrent.futures
+import enum
+import functools
 import json
+import math
 import threading
-from typing import Tuple, Callable
+import uuid
+from typing import Dict, Tuple, Callable
 
 import _quickjs
 
+try:
+    # A C implementation that is considerably faster than threading.RLock when the lock is not
+    # contended, which is the common case here.
+    from fastrlock.rlock import FastRLock as _RLock
+except ImportError:
+    _RLock = threading.RLock
+
+try:
+    # Considerably faster than the json module. Returns bytes, which parse_json accepts as well.
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
 
 def test():
     return _quickjs.test()
@@ -16,12 +33,128 @@ JSException = _quickjs.JSException
 StackOverflow = _quickjs.StackOverflow
 
 
+# Types that are converted directly by the C extension. Checked with type() rather than
+# isinstance() since this is on the hot path of every call.
+_SCALAR_TYPES = frozenset({type(None), str, bool, float, int})
+# Types that are passed to the C extension as they are.
+_DIRECT_TYPES = _SCALAR_TYPES | {Object}
+# Scalar types whose equal values always have the same encoding. Floats are left out because
+# 0.0 == -0.0.
+_HASHABLE_SCALAR_TYPES = frozenset({type(None), str, bool, int})
+
+
+def _json_default(obj):
+    # orjson encodes these itself, so the json module accepts them as well.
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    elif isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Compact UTF-8 output is shorter than the default, both to produce and for QuickJS to parse.
+_json_dumps = functools.partial(json.dumps,
+                                ensure_ascii=False,
+                                separators=(",", ":"),
+                                allow_nan=False,
+                                default=_json_default)
+
+if _orjson is not None:
+    # Types that the json module rejects or encodes differently, and non-string keys, raise
+    # TypeError, since no default function is given to orjson. The json module then decides.
+    _ORJSON_OPTIONS = (_orjson.OPT_PASSTHROUGH_DATACLASS | _orjson.OPT_PASSTHROUGH_DATETIME
+                       | _orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+
+def _replace_non_finite(obj, path=()):
+    """Returns a copy of obj with non-finite floats replaced by None."""
+    if isinstance(obj, enum.Enum):
+        return _replace_non_finite(obj.value, path)
+    elif isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    elif isinstance(obj, (dict, list, tuple)):
+        if id(obj) in path:
+            raise ValueError("Circular reference detected")
+        path = path + (id(obj), )
+        if isinstance(obj, dict):
+            return {key: _replace_non_finite(value, path) for key, value in obj.items()}
+        return [_replace_non_finite(value, path) for value in obj]
+    return obj
+
+
+def _dumps(obj):
+    """Encodes obj as JSON. Gives the same result whether orjson is installed or not.
+
+    Non-finite floats are encoded as null, like orjson and JSON.stringify do.
+    """
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # E.g. integers that do not fit in 64 bits, which the json module handles.
+            pass
+    try:
+        return _json_dumps(obj)
+    except ValueError:
+        # Raised for non-finite floats, which are rare, so only then are they looked for.
+        return _json_dumps(_replace_non_finite(obj))
+
+
+@functools.lru_cache(maxsize=128)
+def _dumps_tuple(types: Tuple[type, ...], arg: tuple):
+    # The element types are part of the key since e.g. (1, True) == (1, 1.0) in Python, but they
+    # encode differently.
+    return _dumps(arg)
+
+
+# Bytecode of the code of recently created functions, so that creating a Function with the same
+# code again does not need to parse it. Oldest entries are evicted first.
+_BYTECODE_CACHE_SIZE = 128
+_bytecode_cache: Dict[str, bytes] = {}
+_bytecode_cache_lock = threading.Lock()
+
+
+# With run_gc="auto", the garbage collection runs after this many calls. QuickJS frees most objects
+# immediately through reference counting, so collecting cycles after every call is rarely needed.
+_GC_INTERVAL = 64
+
+
+def _convert_arg(context: Context, arg):
+    if type(arg) in _DIRECT_TYPES:
+        return arg
+    elif type(arg) is tuple and all(type(a) in _HASHABLE_SCALAR_TYPES for a in arg):
+        # Tuples of scalars are immutable and hashable, so their encoding can be reused when the
+        # same arguments are passed repeatedly. Only the JSON string is cached; each call still
+        # gets a fresh JS object that the function is free to modify.
+        return context.parse_json(_dumps_tuple(tuple(map(type, arg)), arg))
+    else:
+        # More complex objects are passed through JSON.
+        return context.parse_json(_dumps(arg))
+
+
+def _convert_args(context: Context, args: tuple) -> list:
+    # An object passed more than once is only converted once. This saves work and keeps the
+    # arguments identical in JS, as they were in Python. The ids can not be reused by other objects
+    # during the call since args keeps them alive.
+    converted = {}
+    js_args = []
+    for arg in args:
+        key = id(arg)
+        if key not in converted:
+            converted[key] = _convert_arg(context, arg)
+        js_args.append(converted[key])
+    return js_args
+
+
 class Function:
     # There are unit tests demonstrating that we are crashing if different threads are accessing the
     # same runtime, even if it is not at the same time. So we run everything on the same thread in
     # order to prevent this.
-    _threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-    
+    _shared_threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    # The attributes are accessed on every call, which is faster with slots than with a dict.
+    __slots__ = ("_threadpool", "_lock", "_calls_since_gc", "_context", "_f", "__weakref__")
+
     def __init__(self, name: str, code: str, *, own_executor=False) -> None:
         """
         Arguments:
@@ -33,17 +166,23 @@ class Function:
         """
         if own_executor:
             self._threadpool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        self._lock = threading.Lock()
+        else:
+            self._threadpool = self._shared_threadpool
+        self._lock = _RLock()
+        self._calls_since_gc = 0
 
-        future = self._threadpool.submit(self._compile, name, code)
-        concurrent.futures.wait([future])
-        self._context, self._f = future.result()
+        self._context, self._f = self._threadpool.submit(self._compile, name, code).result()
 
-    def __call__(self, *args, run_gc=True):
+    def __call__(self, *args, run_gc="auto"):
+        """Calls the function with the provided arguments.
+
+        Arguments:
+            run_gc: Whether to run the garbage collection after the call. True runs it after every
+                    call, False never and "auto" after every 64th call.
+        """
         with self._lock:
-            future = self._threadpool.submit(self._call, *args, run_gc=run_gc)
-            concurrent.futures.wait([future])
-            return future.result()
+            # result() blocks until the call has finished on the executor thread.
+            return self._threadpool.submit(self._call, *args, run_gc=run_gc).result()
 
     def set_memory_limit(self, limit):
         with self._lock:
@@ -68,10 +207,12 @@ class Function:
     def gc(self):
         """Manually run the garbage collection.
 
-        It will run by default when calling the function unless otherwise specified.
+        It will run by default every now and then when calling the function unless otherwise
+        specified.
         """
         with self._lock:
             self._context.gc()
+            self._calls_since_gc = 0
 
     def execute_pending_job(self) -> bool:
         with self._lock:
@@ -84,23 +225,30 @@ class Function:
 
     def _compile(self, name: str, code: str) -> Tuple[Context, Object]:
         context = Context()
-        context.eval(code)
+        bytecode = _bytecode_cache.get(code)
+        if bytecode is None:
+            bytecode = context.compile(code)
+            with _bytecode_cache_lock:
+                if len(_bytecode_cache) >= _BYTECODE_CACHE_SIZE:
+                    del _bytecode_cache[next(iter(_bytecode_cache))]
+                _bytecode_cache[code] = bytecode
+        context.eval_bytecode(bytecode)
         f = context.get(name)
         return context, f
 
-    def _call(self, *args, run_gc=True):
-        def convert_arg(arg):
-            if isinstance(arg, (type(None), str, bool, float, int)):
-                return arg
-            else:
-                # More complex objects are passed through JSON.
-                return self._context.parse_json(json.dumps(arg))
-
+    def _call(self, *args, run_gc="auto"):
         try:
-            result = self._f(*[convert_arg(a) for a in args])
+            if all(type(a) in _DIRECT_TYPES for a in args):
+                result = self._f.call_with_args(args)
+            else:
+                result = self._f.call_with_args(_convert_args(self._context, args))
             if isinstance(result, Object):
-                result = json.loads(result.json())            
+                result = result.to_python()
             return result
         finally:
+            if run_gc == "auto":
+                self._calls_since_gc += 1
+                run_gc = self._calls_since_gc >= _GC_INTERVAL
             if run_gc:
                 self._context.gc()
+                self._calls_since_gc = 0
@@ -1,47 +1,162 @@
 import concurrent.futures
+import dataclasses
+import datetime
+import enum
 import gc
 import json
+import mmap
+import os
+import tempfile
 import unittest
+import unittest.mock
+import uuid
 
 import quickjs
 
+assert quickjs.test() == 42, "The quickjs extension failed its self-test."
 
-class LoadModule(unittest.TestCase):
-    def test_42(self):
-        self.assertEqual(quickjs.test(), 42)
 
+def make_context():
+    context = quickjs.Context()
+    if os.environ.get("QUICKJS_WARMUP") == "1":
+        # Pays one-time costs like allocations and atom creation up front, which makes the
+        # timings of the tests more stable.
+        context.eval("(function() { for (let i = 0; i < 100; i++) { ({x: i, y: i}); } })()")
+    return context
 
-class Context(unittest.TestCase):
-    def setUp(self):
-        self.context = quickjs.Context()
 
-    def test_eval_int(self):
-        self.assertEqual(self.context.eval("40 + 2"), 42)
+def make_eval_test(code, expected):
+    def test(self):
+        result = self.context.eval(code)
+        if expected is None or isinstance(expected, bool):
+            self.assertIs(result, expected)
+        else:
+            self.assertEqual(result, expected)
+
+    return test
+
+
+class StatelessContext(unittest.TestCase):
+    """Tests that do not modify the context, so that they can share one."""
+    @classmethod
+    def setUpClass(cls):
+        cls.context = make_context()
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.context
+
+    def test_eval_strings(self):
+        self.assertEqual(self.context.eval("'a\\0b'"), "a\0b")
+        self.assertEqual(self.context.eval("'x'.repeat(100)"), "x" * 100)
+        self.assertEqual(self.context.eval("'åäö'"), "åäö")
+        self.assertEqual(self.context.eval("'å'.repeat(100)"), "å" * 100)
+
+    def test_eval_literals(self):
+        self.assertIs(self.context.eval(" true\n"), True)
+        self.assertIs(self.context.eval("false;"), False)
+        self.assertIsNone(self.context.eval("\tnull "))
+        self.assertIsNone(self.context.eval("undefined\n"))
+        with self.assertRaisesRegex(quickjs.JSException, "ReferenceError"):
+            self.context.eval("nullx")
+
+    def test_eval_expr(self):
+        self.assertIs(self.context.eval_expr("40 + 2"), 42)
+        self.assertEqual(self.context.eval_expr("{}").json(), "{}")
+        self.assertEqual(self.context.eval_expr("42 // Comment."), 42)
+        with self.assertRaisesRegex(quickjs.JSException, "SyntaxError"):
+            self.context.eval_expr("x = 40; 2")
 
-    def test_eval_float(self):
-        self.assertEqual(self.context.eval("40.0 + 2.0"), 42.0)
+    def test_wrong_type(self):
+        with self.assertRaises(TypeError):
+            self.assertEqual(self.context.eval(1), 42)
 
-    def test_eval_str(self):
-        self.assertEqual(self.context.eval("'4' + '2'"), "42")
+    def test_error(self):
+        with self.assertRaises(quickjs.JSException) as cm:
+            self.context.eval("missing + missing")
+        self.assertEqual(cm.exception.error_name, "ReferenceError")
+        self.assertIn("ReferenceError: 'missing' is not defined", str(cm.exception))
 
-    def test_eval_bool(self):
-        self.assertEqual(self.context.eval("true || false"), True)
-        self.assertEqual(self.context.eval("true && false"), False)
+    def test_error_name(self):
+        with self.assertRaises(quickjs.JSException) as cm:
+            self.context.eval("null.x")
+        self.assertEqual(cm.exception.error_name, "TypeError")
+        with self.assertRaises(quickjs.JSException) as cm:
+            self.context.eval("throw 42")
+        self.assertIsNone(cm.exception.error_name)
 
-    def test_eval_null(self):
-        self.assertIsNone(self.context.eval("null"))
+    def test_memory_usage(self):
+        self.assertIn("memory_used_size", self.context.memory().keys())
 
-    def test_eval_undefined(self):
-        self.assertIsNone(self.context.eval("undefined"))
+    def test_json_simple(self):
+        self.assertEqual(self.context.parse_json("42"), 42)
 
-    def test_wrong_type(self):
+    def test_json_unicode(self):
+        self.assertEqual(self.context.parse_json('"\u00e4pple ≤≥"'), "äpple ≤≥")
+
+    def test_json_error(self):
+        with self.assertRaisesRegex(quickjs.JSException, "unexpected token"):
+            self.context.parse_json("a b c")
+
+    def test_compile_error(self):
+        with self.assertRaisesRegex(quickjs.JSException, "SyntaxError"):
+            self.context.compile("a b c")
+
+    def test_eval_bytecode_wrong_type(self):
         with self.assertRaises(TypeError):
-            self.assertEqual(self.context.eval(1), 42)
+            self.context.eval_bytecode("40 + 2")
+
+
+# Each case becomes its own test method, e.g. StatelessContext.test_eval_int.
+EVAL_CASES = [
+    ("int", "40 + 2", 42),
+    ("float", "40.0 + 2.0", 42.0),
+    ("str", "'4' + '2'", "42"),
+    ("true", "true || false", True),
+    ("false", "true && false", False),
+    ("null", "null", None),
+    ("undefined", "undefined", None),
+]
+
+
+def add_eval_tests(cls, cases):
+    for name, code, expected in cases:
+        setattr(cls, f"test_eval_{name}", make_eval_test(code, expected))
+
+
+add_eval_tests(StatelessContext, EVAL_CASES)
+
+
+class Context(unittest.TestCase):
+    def setUp(self):
+        self.context = make_context()
 
     def test_context_between_calls(self):
         self.context.eval("x = 40; y = 2;")
         self.assertEqual(self.context.eval("x + y"), 42)
 
+    def test_eval_many(self):
+        self.assertEqual(self.context.eval_many(["x = 40; y = 2;", "x + y", "'abc'"]),
+                         [2, 42, "abc"])
+        self.assertEqual(self.context.eval_many(("x + y", )), [42])
+        self.assertEqual(self.context.eval_many([]), [])
+
+    def test_eval_many_error(self):
+        with self.assertRaisesRegex(quickjs.JSException, "ReferenceError: 'missing' is not"):
+            self.context.eval_many(["x = 1", "missing", "x = 2"])
+        self.assertEqual(self.context.eval("x"), 1)
+        with self.assertRaises(TypeError):
+            self.context.eval_many(["x = 1", 2])
+        with self.assertRaises(TypeError):
+            self.context.eval_many(1)
+
+    def test_eval_many_modified_during_call(self):
+        # Not a literal, so that only the list refers to the string.
+        sources = ["clear_sources()", "".join(["40", " + 2"])]
+        self.context.add_callable("clear_sources", lambda: sources.clear())
+        self.assertEqual(self.context.eval_many(sources), [None, 42])
+        self.assertEqual(sources, [])
+
     def test_function(self):
         self.context.eval("""
             function special(x) {
@@ -49,12 +164,35 @@ class Context(unittest.TestCase):
             }
             """)
         self.assertEqual(self.context.eval("special(2)"), 42)
+        # Calling the function object directly does not parse any code.
+        special = self.context.get("special")
+        self.assertEqual(special(2), 42)
+
+    def test_eval_same_code(self):
+        code = "var calls = (typeof calls === 'undefined' ? 0 : calls) + 1; calls"
+        self.assertEqual(self.context.eval(code), 1)
+        self.assertEqual(self.context.eval(code), 2)
+        self.context.eval_cache_clear()
+        self.assertEqual(self.context.eval(code), 3)
+
+    def test_eval_same_code_error(self):
+        self.context.eval("let x = 1;")
+        with self.assertRaisesRegex(quickjs.JSException, "SyntaxError"):
+            self.context.eval("let x = 1;")
+        for i in range(2):
+            with self.assertRaisesRegex(quickjs.JSException, "SyntaxError"):
+                self.context.eval("a b c")
+
+    def test_eval_many_different(self):
+        for i in range(1000):
+            self.assertEqual(self.context.eval(f"{i} + 1"), i + 1)
+        self.assertEqual(self.context.eval("0 + 1"), 1)
 
     def test_get(self):
         self.context.eval("x = 42; y = 'foo';")
         self.assertEqual(self.context.get("x"), 42)
         self.assertEqual(self.context.get("y"), "foo")
-        self.assertEqual(self.context.get("z"), None)
+        self.assertIsNone(self.context.get("z"))
 
     def test_set(self):
         self.context.eval("x = 'overriden'")
@@ -63,6 +201,12 @@ class Context(unittest.TestCase):
         self.assertTrue(self.context.eval("x == 42"))
         self.assertTrue(self.context.eval("y == 'foo'"))
 
+    def test_set_strings(self):
+        self.context.set("x", "a\0b")
+        self.assertEqual(self.context.eval("x.length"), 3)
+        with self.assertRaises(UnicodeEncodeError):
+            self.context.set("x", "\ud800")
+
     def test_module(self):
         self.context.module("""
             export function test() {
@@ -70,10 +214,6 @@ class Context(unittest.TestCase):
             }
         """)
 
-    def test_error(self):
-        with self.assertRaisesRegex(quickjs.JSException, "ReferenceError: 'missing' is not defined"):
-            self.context.eval("missing + missing")
-
     def test_lifetime(self):
         def get_f():
             context = quickjs.Context()
@@ -141,23 +281,24 @@ class Context(unittest.TestCase):
         self.context.set_time_limit(-1)
         self.context.eval(code)
 
-    def test_memory_usage(self):
-        self.assertIn("memory_used_size", self.context.memory().keys())
-
-    def test_json_simple(self):
-        self.assertEqual(self.context.parse_json("42"), 42)
+    def test_compile(self):
+        bytecode = self.context.compile("x = 40; function f(y) { return x + y; } f(2)")
+        self.assertIsInstance(bytecode, bytes)
+        self.assertIsNone(self.context.get("x"))
+        self.assertEqual(self.context.eval_bytecode(bytecode), 42)
+        self.assertEqual(self.context.eval("f(1)"), 41)
 
-    def test_json_error(self):
-        with self.assertRaisesRegex(quickjs.JSException, "unexpected token"):
-            self.context.parse_json("a b c")
+        other_context = quickjs.Context()
+        self.assertEqual(other_context.eval_bytecode(bytecode), 42)
+        self.assertEqual(other_context.eval_bytecode(bytecode), 42)
 
     def test_execute_pending_job(self):
         self.context.eval("obj = {}")
-        self.assertEqual(self.context.execute_pending_job(), False)
+        self.assertIs(self.context.execute_pending_job(), False)
         self.context.eval("Promise.resolve().then(() => {obj.x = 1;})")
-        self.assertEqual(self.context.execute_pending_job(), True)
+        self.assertIs(self.context.execute_pending_job(), True)
         self.assertEqual(self.context.eval("obj.x"), 1)
-        self.assertEqual(self.context.execute_pending_job(), False)
+        self.assertIs(self.context.execute_pending_job(), False)
 
     def test_global(self):
         self.context.set("f", self.context.globalThis)
@@ -167,6 +308,60 @@ class Context(unittest.TestCase):
             self.context.globalThis = 1
 
 
+class Bytecode(unittest.TestCase):
+    SCRIPTS = {
+        "eval_int": "40 + 2",
+        "eval_float": "40.0 + 2.0",
+        "eval_str": "'4' + '2'",
+        "eval_bool": "true || false",
+        "function": """
+            function special(x) {
+                return 40 + x;
+            }
+            special(2);
+            """,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        # Compiled once for all tests.
+        context = quickjs.Context()
+        cls.bytecode = {name: context.compile(code) for name, code in cls.SCRIPTS.items()}
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.bytecode
+
+    def setUp(self):
+        self.context = quickjs.Context()
+
+    def test_eval_int(self):
+        self.assertIs(self.context.eval_bytecode(self.bytecode["eval_int"]), 42)
+
+    def test_eval_float(self):
+        self.assertEqual(self.context.eval_bytecode(self.bytecode["eval_float"]), 42.0)
+
+    def test_eval_str(self):
+        self.assertEqual(self.context.eval_bytecode(self.bytecode["eval_str"]), "42")
+
+    def test_eval_bool(self):
+        self.assertIs(self.context.eval_bytecode(self.bytecode["eval_bool"]), True)
+
+    def test_function(self):
+        self.assertEqual(self.context.eval_bytecode(self.bytecode["function"]), 42)
+        self.assertEqual(self.context.eval("special(2)"), 42)
+
+    def test_buffers(self):
+        bytecode = self.bytecode["eval_int"]
+        self.assertEqual(self.context.eval_bytecode(bytearray(bytecode)), 42)
+        self.assertEqual(self.context.eval_bytecode(memoryview(bytecode)), 42)
+        with tempfile.TemporaryFile() as f:
+            f.write(bytecode)
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(self.context.eval_bytecode(mapped), 42)
+
+
 class CallIntoPython(unittest.TestCase):
     def setUp(self):
         self.context = quickjs.Context()
@@ -195,6 +390,43 @@ class CallIntoPython(unittest.TestCase):
         )""")
         self.assertEqual(g(), 42)
 
+    def test_python_function_from_to_json(self):
+        self.context.add_callable("f", lambda: 42)
+        d = self.context.eval("({toJSON() { return f(); }})")
+        self.assertEqual(d.json(), "42")
+
+    def test_python_function_from_getter_and_setter(self):
+        values = []
+        self.context.add_callable("get", lambda: 42)
+        self.context.add_callable("set", values.append)
+        self.context.eval("""
+            Object.defineProperty(globalThis, "x", {
+                get: function() { return get(); },
+                set: function(v) { set(v); },
+            });
+        """)
+        self.assertEqual(self.context.get("x"), 42)
+        self.context.set("x", 2)
+        self.assertEqual(values, [2])
+
+    def test_python_function_freed_while_parsing_json(self):
+        self.context.add_callable("pyfunc", lambda: 1)
+        # A cycle, so that the function is only freed by the garbage collector.
+        self.context.eval("var o = {f: pyfunc}; o.self = o; pyfunc = null; o = null;")
+        data = json.dumps([{"a": i} for i in range(10000)])
+        for _ in range(10):
+            self.context.parse_json(data)
+
+    def test_python_function_from_thrown_object(self):
+        self.context.add_callable("pyname", lambda: "CustomError")
+        with self.assertRaises(quickjs.JSException) as cm:
+            self.context.eval("""throw {
+                get name() { return pyname(); },
+                toString() { return pyname() + ": message"; },
+            }""")
+        self.assertEqual(cm.exception.error_name, "CustomError")
+        self.assertIn("CustomError: message", str(cm.exception))
+
     def test_python_function_raises(self):
         def error(a):
             raise ValueError("A")
@@ -344,6 +576,15 @@ class Object(unittest.TestCase):
             s += f(1, 1)
         self.assertEqual(s, 2 * n)
 
+    def test_function_call_many_args(self):
+        f = self.context.eval("""
+            f = function(...args) {
+                return args.reduce((a, b) => a + b, 0);
+            }
+            """)
+        self.assertEqual(f(*range(8)), 28)
+        self.assertEqual(f(*range(100)), 4950)
+
     def test_function_call_str(self):
         f = self.context.eval("""
             f = function(a) {
@@ -372,6 +613,19 @@ class Object(unittest.TestCase):
         self.assertEqual(f(d), 42)
         self.assertEqual(f(d), 42)
 
+    def test_function_call_with_args(self):
+        f = self.context.eval("""
+            f = function(x, y) {
+                return 40 + x + y;
+            }
+            """)
+        self.assertEqual(f.call_with_args((1, 1)), 42)
+        self.assertEqual(f.call_with_args([1, 1]), 42)
+        with self.assertRaisesRegex(TypeError, "tuple or a list"):
+            f.call_with_args(1)
+        with self.assertRaisesRegex(TypeError, "Unsupported type"):
+            f.call_with_args([{}])
+
     def test_function_call_unsupported_arg(self):
         f = self.context.eval("""
             f = function(x) {
@@ -385,6 +639,88 @@ class Object(unittest.TestCase):
         d = self.context.eval("d = {data: 42};")
         self.assertEqual(json.loads(d.json()), {"data": 42})
 
+    def test_to_python(self):
+        d = self.context.eval("""({
+            a: [1, 2.5, "three", true, null, undefined, () => 1],
+            b: {c: {d: 42}},
+            e: undefined,
+            f: function() {},
+            g: 2 ** 100,
+            h: 4 / 2,
+            i: NaN,
+            j: new Date(0),
+            "2": "key",
+        })""")
+        self.assertEqual(d.to_python(), json.loads(d.json()))
+        self.assertEqual(
+            d.to_python(), {
+                "2": "key",
+                "a": [1, 2.5, "three", True, None, None, None],
+                "b": {"c": {"d": 42}},
+                "g": 2**100,
+                "h": 2,
+                "i": None,
+                "j": "1970-01-01T00:00:00.000Z",
+            })
+
+    def test_to_python_like_json(self):
+        d = self.context.eval("""({
+            n: new Number(5),
+            s: new String("x"),
+            b: new Boolean(false),
+            k: {toJSON(key) { return "key=" + key; }},
+            l: [{toJSON(key) { return "key=" + key; }}],
+            u: {toJSON() { return undefined; }},
+        })""")
+        self.assertEqual(d.to_python(), json.loads(d.json()))
+        self.assertEqual(d.to_python(), {
+            "n": 5,
+            "s": "x",
+            "b": False,
+            "k": "key=k",
+            "l": ["key=0"]
+        })
+        self.assertEqual(
+            self.context.eval("({toJSON(key) { return [key]; }})").to_python(), [""])
+
+    def test_to_python_boxed_by_class(self):
+        d = self.context.eval("""
+            class N extends Number {}
+            ({
+                n: new N(5),
+                on: Object.create(Number.prototype),
+                os: Object.create(String.prototype),
+                ob: Object.create(Boolean.prototype),
+                d: new Date(0),
+                fake: {[Symbol.toStringTag]: "Number", x: 1},
+            })""")
+        self.assertEqual(d.to_python(), json.loads(d.json()))
+        self.assertEqual(d.to_python(), {
+            "n": 5,
+            "on": {},
+            "os": {},
+            "ob": {},
+            "d": "1970-01-01T00:00:00.000Z",
+            "fake": {
+                "x": 1
+            }
+        })
+        # JSON.stringify in QuickJS does not write valid JSON for these.
+        self.assertEqual(self.context.eval("[new Number(NaN)]").to_python(), [None])
+
+    def test_to_python_negative_length(self):
+        a = self.context.eval(
+            'new Proxy([], {get(t, k) { return k === "length" ? -1 : t[k]; }})')
+        self.assertEqual(a.to_python(), [])
+        self.assertEqual(a.to_python(), json.loads(a.json()))
+
+    def test_to_python_circular(self):
+        d = self.context.eval("d = {}; d.d = d; d")
+        with self.assertRaisesRegex(quickjs.JSException, "circular"):
+            d.to_python()
+        a = self.context.eval("a = {}; [a, a]")
+        self.assertEqual(a.to_python(), [{}, {}])
+
     def test_call_nonfunction(self):
         d = self.context.eval("({data: 42})")
         with self.assertRaisesRegex(quickjs.JSException, "TypeError: not a function"):
@@ -399,6 +735,23 @@ class Object(unittest.TestCase):
             f(d)
 
 
+class MyInt(int):
+    pass
+
+
+class MyStr(str):
+    pass
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
 class FunctionTest(unittest.TestCase):
     def test_adder(self):
         f = quickjs.Function(
@@ -421,6 +774,11 @@ class FunctionTest(unittest.TestCase):
         for x in [True, [1], {"a": 2}, 1, 1.5, "hej", None]:
             self.assertEqual(identity(x), x)
 
+    def test_scalar_subclasses(self):
+        identity = quickjs.Function("identity", "function identity(x) { return x; }")
+        self.assertEqual(identity(MyInt(42)), 42)
+        self.assertEqual(identity(MyStr("42")), "42")
+
     def test_bool(self):
         f = quickjs.Function(
             "f", """
@@ -433,7 +791,7 @@ class FunctionTest(unittest.TestCase):
 
     def test_empty(self):
         f = quickjs.Function("f", "function f() { }")
-        self.assertEqual(f(), None)
+        self.assertIsNone(f())
 
     def test_lists(self):
         f = quickjs.Function(
@@ -447,6 +805,95 @@ class FunctionTest(unittest.TestCase):
             }""")
         self.assertEqual(f([0, 1, 2]), [42, 43, 44])
 
+    def test_tuples(self):
+        f = quickjs.Function(
+            "f", """
+            function f(arr) {
+                arr.push(typeof arr[0]);
+                return arr;
+            }""")
+        self.assertEqual(f((1, 2)), [1, 2, "number"])
+        # The JS array is modified by the function, but the next call gets a fresh one.
+        self.assertEqual(f((1, 2)), [1, 2, "number"])
+        self.assertEqual(f((True, 2)), [True, 2, "boolean"])
+
+    def test_tuples_negative_zero(self):
+        f = quickjs.Function("f", "function f(t) { return Object.is(t[0], -0); }")
+        self.assertIs(f((-0.0, )), True)
+        self.assertIs(f((0.0, )), False)
+
+    def test_lone_surrogates(self):
+        f = quickjs.Function("f", r'function f() { return ["\u{1F600}".slice(0, 1)]; }')
+        self.assertEqual(f(), ["\ud83d"])
+        context = quickjs.Context()
+        a = context.eval('["\\ud83d"]')
+        self.assertEqual(a.to_python(), json.loads(a.json()))
+
+    def test_large_integers(self):
+        identity = quickjs.Function("identity", "function identity(x) { return x; }")
+        self.assertEqual(identity([2**64]), [2**64])
+        self.assertEqual(identity({1: 2}), {"1": 2})
+
+    def test_json_arguments(self):
+        # The same with and without orjson.
+        identity = quickjs.Function("identity", "function identity(x) { return x; }")
+        self.assertEqual(identity([None, 1.5, "å"]), [None, 1.5, "å"])
+        self.assertEqual(identity({True: None, 1.5: 2}), {"true": None, "1.5": 2})
+        self.assertEqual(identity([Color.RED]), ["red"])
+        u = uuid.UUID(int=1)
+        self.assertEqual(identity([u]), [str(u)])
+        self.assertEqual(identity([MyInt(1), MyStr("a")]), [1, "a"])
+        self.assertEqual(identity([float("nan"), {"a": float("-inf")}]), [None, {"a": None}])
+        self.assertEqual(identity([Color.RED, (float("inf"), )]), ["red", [None]])
+        circular = [float("nan")]
+        circular.append(circular)
+        with self.assertRaises(ValueError):
+            identity(circular)
+        with self.assertRaises(TypeError):
+            identity([datetime.date(2000, 1, 1)])
+        with self.assertRaises(TypeError):
+            identity([Point(1)])
+
+    @unittest.skipIf(quickjs._orjson is None, "orjson is not installed")
+    def test_orjson_same_as_json(self):
+        values = [
+            [1, 2.5, "å", None, True],
+            {"a": [{}]},
+            {1: 2},
+            [2**64],
+            [MyInt(1), MyStr("a")],
+            [Color.RED, uuid.UUID(int=1)],
+            [float("inf"), {"a": float("nan")}],
+            [datetime.datetime(2000, 1, 1)],
+            [Point(1)],
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                try:
+                    with unittest.mock.patch.object(quickjs, "_orjson", None):
+                        expected = quickjs._dumps(value)
+                except (TypeError, ValueError) as e:
+                    with self.assertRaises(type(e)):
+                        quickjs._dumps(value)
+                else:
+                    self.assertEqual(json.loads(quickjs._dumps(value)), json.loads(expected))
+
+    @unittest.skipIf(quickjs._orjson is None, "orjson is not installed")
+    def test_orjson_used(self):
+        # orjson returns bytes, the json module str.
+        self.assertIsInstance(quickjs._dumps([None, "nullable", {"a": 1.5}]), bytes)
+        self.assertIsInstance(quickjs._dumps([float("nan")]), bytes)
+
+    def test_same_argument_twice(self):
+        f = quickjs.Function(
+            "f", """
+            function f(x, y, z) {
+                x.value += 1;
+                return [x === y, y.value, z.value];
+            }""")
+        d = {"value": 1}
+        self.assertEqual(f(d, d, {"value": 1}), [True, 2, 1])
+
     def test_dict(self):
         f = quickjs.Function(
             "f", """
@@ -495,6 +942,39 @@ class FunctionTest(unittest.TestCase):
         f.gc()
         self.assertLessEqual(f.memory()["obj_count"], initial_count)
 
+    def test_same_code_twice(self):
+        code = """
+            let calls = 0;
+            function f() {
+                return ++calls;
+            }
+        """
+        f1 = quickjs.Function("f", code)
+        f2 = quickjs.Function("f", code)
+        self.assertEqual(f1(), 1)
+        self.assertEqual(f1(), 2)
+        self.assertEqual(f2(), 1)
+
+    def test_syntax_error(self):
+        with self.assertRaisesRegex(quickjs.JSException, "SyntaxError"):
+            quickjs.Function("f", "function f( {")
+
+    def test_garbage_collection_auto(self):
+        f = quickjs.Function(
+            "f", """
+            function f() {
+                let a = {};
+                a.a = a;
+            }
+        """)
+        f(run_gc=True)
+        initial_count = f.memory()["obj_count"]
+        for i in range(63):
+            f()
+        self.assertGreater(f.memory()["obj_count"], initial_count)
+        f()
+        self.assertLessEqual(f.memory()["obj_count"], initial_count)
+
     def test_deep_recursion(self):
         f = quickjs.Function(
             "f", """
@@ -509,8 +989,9 @@ class FunctionTest(unittest.TestCase):
 
         self.assertEqual(f(100), 100)
         limit = 500
-        with self.assertRaises(quickjs.StackOverflow):
+        with self.assertRaises(quickjs.StackOverflow) as cm:
             f(limit)
+        self.assertEqual(cm.exception.error_name, "InternalError")
         f.set_max_stack_size(2000 * limit)
         self.assertEqual(f(limit), limit)
 
@@ -525,6 +1006,17 @@ class FunctionTest(unittest.TestCase):
 
         self.assertEqual(f(), 42)
 
+    def test_add_callable_getter_in_result(self):
+        f = quickjs.Function(
+            "f", """
+            function f() {
+                return {get x() { return pget(); }, y: [{get z() { return pget(); }}]};
+            }
+        """)
+        f.add_callable("pget", lambda: 42)
+
+        self.assertEqual(f(), {"x": 42, "y": [{"z": 42}]})
+
     def test_execute_pending_job(self):
         f = quickjs.Function(
             "f", """
@@ -539,11 +1031,11 @@ class FunctionTest(unittest.TestCase):
             }
         """)
         self.assertEqual(f(), 0)
-        self.assertEqual(f.execute_pending_job(), True)
+        self.assertIs(f.execute_pending_job(), True)
         self.assertEqual(f(), 1)
-        self.assertEqual(f.execute_pending_job(), True)
+        self.assertIs(f.execute_pending_job(), True)
         self.assertEqual(f(), 2)
-        self.assertEqual(f.execute_pending_job(), False)
+        self.assertIs(f.execute_pending_job(), False)
 
     def test_global(self):
         f = quickjs.Function(
@@ -555,6 +1047,17 @@ class FunctionTest(unittest.TestCase):
         with self.assertRaises(AttributeError):
             f.globalThis = 1
 
+    def test_object_argument(self):
+        f = quickjs.Function(
+            "f", """
+            function f(x, y) {
+                return x === globalThis && y.a === 1;
+            }
+        """)
+        self.assertTrue(f(f.globalThis, {"a": 1}))
+        with self.assertRaisesRegex(ValueError, "different contexts"):
+            f(quickjs.Context().globalThis, {"a": 1})
+
 
 class JavascriptFeatures(unittest.TestCase):
     def test_unicode_strings(self):
@@ -568,6 +1071,7 @@ class JavascriptFeatures(unittest.TestCase):
         for x in ["äpple", "≤≥", "☺"]:
             self.assertEqual(identity(x), x)
             self.assertEqual(context.eval('(function(){ return "' + x + '";})()'), x)
+        self.assertEqual(identity(["äpple", {"≤≥": "☺"}]), ["äpple", {"≤≥": "☺"}])
 
     def test_es2020_optional_chaining(self):
         f = quickjs.Function(